@@ -1,25 +1,32 @@
 from __future__ import annotations
 
 import argparse
-import json
 from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from .core import (
     DEFAULT_CACHE_TTL_DAYS,
     DEFAULT_OEIS_BASE,
     OeisCache,
+    build_stripped_index,
     hits_from_online_json,
     hits_to_jsonable,
+    json_dumps,
+    materialize_stripped,
     mismatch_details,
-    oeis_fetch_by_id_online,
+    oeis_fetch_by_ids_online,
+    oeis_search_offline_index,
     oeis_search_offline_stripped,
     oeis_search_online,
     parse_terms,
     pretty_print_hits,
     sort_hits,
+    write_json,
 )
 
+DEFAULT_CACHE_DB = Path.home() / ".cache" / "oeis_probe" / "oeis_cache.sqlite"
+
 
 def _online_probe_with_optional_relax(
     terms: Sequence[int],
@@ -36,13 +43,15 @@ def _online_probe_with_optional_relax(
     """
     Run online probe. If relax_online=True and OEIS returns no results, retry by shortening
     the query prefix (drop terms from the end) down to relax_min_terms.
+    The prefix shrinks by a quarter per empty answer, then a binary search between the
+    last empty and the first non-empty length pins the longest prefix OEIS still knows,
+    so a long query costs O(log n) round-trips instead of one per dropped term.
     Returns (hits, error_str).
     """
     try:
-        qlen = min(len(terms), max_query_terms)
-        qlen = max(1, qlen)
+        terms = tuple(terms)
 
-        while True:
+        def probe(qlen: int) -> list:
             payload = oeis_search_online(
                 terms,
                 oeis_base=oeis_base,
@@ -50,13 +59,33 @@ def _online_probe_with_optional_relax(
                 timeout=timeout,
                 cache=cache,
                 cache_ttl_days=cache_ttl_days,
+                minimal=True,
             )
-            hits = hits_from_online_json(terms, payload, max_hits=max_hits)
+            return hits_from_online_json(terms, payload, max_hits=max_hits)
 
-            if hits or not relax_online or qlen <= relax_min_terms:
-                return hits, None
+        qlen = min(len(terms), max_query_terms)
+        qlen = max(1, qlen)
+        shortest_empty = None
 
-            qlen -= 1
+        while True:
+            hits = probe(qlen)
+            if hits or not relax_online or qlen <= relax_min_terms:
+                break
+            shortest_empty = qlen
+            qlen = max(relax_min_terms, qlen - max(1, qlen // 4))
+
+        if not hits or shortest_empty is None:
+            return hits, None
+
+        lo, hi = qlen, shortest_empty - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            mid_hits = probe(mid)
+            if mid_hits:
+                lo, hits = mid, mid_hits
+            else:
+                hi = mid - 1
+        return hits, None
 
     except Exception as ex:  # noqa: BLE001
         return [], str(ex)
@@ -111,7 +140,7 @@ def main(argv: Sequence[str] | None = None) -> int:
     p_probe.add_argument(
         "--cache-db",
         type=Path,
-        default=Path.home() / ".cache" / "oeis_probe" / "oeis_cache.sqlite",
+        default=DEFAULT_CACHE_DB,
     )
     p_probe.add_argument("--cache-ttl-days", type=int, default=DEFAULT_CACHE_TTL_DAYS)
 
@@ -127,8 +156,37 @@ def main(argv: Sequence[str] | None = None) -> int:
         default=8,
         help="Minimum number of terms to keep when --relax-online is enabled (default: 8).",
     )
+    p_probe.add_argument(
+        "--relax-offline",
+        action="store_true",
+        help="Offline: also accept sequences containing only a query prefix of at least "
+        "--relax-min-terms terms (scans the whole file, keeps the longest prefixes).",
+    )
     p_probe.add_argument("--offline-stripped", type=Path, help="path to stripped or stripped.gz")
     p_probe.add_argument("--offline-names", type=Path, help="path to names or names.gz (optional)")
+    p_probe.add_argument(
+        "--offline-index",
+        type=Path,
+        help="path to an index built with 'build-index' (used instead of scanning "
+        "--offline-stripped)",
+    )
+    p_probe.add_argument(
+        "--offline-index-cache",
+        action="store_true",
+        help="use the index stored in --cache-db (built by 'build-index' without --index)",
+    )
+    p_probe.add_argument(
+        "--offline-workers",
+        type=int,
+        default=1,
+        help="processes scanning an uncompressed --offline-stripped file (default: 1)",
+    )
+    p_probe.add_argument(
+        "--offline-unpack",
+        action="store_true",
+        help="decompress a .gz --offline-stripped once next to --cache-db and search the "
+        "plain copy in place (faster from the second run on)",
+    )
     p_probe.add_argument(
         "--offline-max-scan", type=int, default=None, help="stop offline scan after N lines (debug)"
     )
@@ -157,35 +215,61 @@ def main(argv: Sequence[str] | None = None) -> int:
     )
 
     p_fetch = sub.add_parser("fetch", help="fetch by A-number (online, JSON)")
-    p_fetch.add_argument("a_number", help="A-number like A000045")
+    p_fetch.add_argument(
+        "a_numbers",
+        nargs="+",
+        metavar="A_NUMBER",
+        help="A-number like A000045; several are fetched in parallel and printed as "
+        "{A-number: payload}",
+    )
     p_fetch.add_argument("--timeout", type=float, default=10.0)
     p_fetch.add_argument("--oeis-base", default=DEFAULT_OEIS_BASE)
     p_fetch.add_argument(
         "--cache-db",
         type=Path,
-        default=Path.home() / ".cache" / "oeis_probe" / "oeis_cache.sqlite",
+        default=DEFAULT_CACHE_DB,
     )
     p_fetch.add_argument("--cache-ttl-days", type=int, default=DEFAULT_CACHE_TTL_DAYS)
 
+    p_index = sub.add_parser("build-index", help="build an offline index from stripped(.gz)")
+    p_index.add_argument(
+        "--stripped", type=Path, required=True, help="path to stripped or stripped.gz"
+    )
+    p_index.add_argument(
+        "--index",
+        type=Path,
+        default=DEFAULT_CACHE_DB,
+        help="output index path (SQLite, default: the probe cache DB)",
+    )
+
     if argv is None:
         import sys
 
         argv = sys.argv[1:]
-    if not argv or (argv and argv[0] not in {"probe", "fetch"}):
+    if not argv or (argv and argv[0] not in {"probe", "fetch", "build-index"}):
         argv = ["probe"] + list(argv)
 
     args = parser.parse_args(list(argv))
 
     if args.cmd == "fetch":
-        cache = OeisCache(args.cache_db)
-        payload = oeis_fetch_by_id_online(
-            args.a_number,
-            oeis_base=args.oeis_base,
-            timeout=args.timeout,
-            cache=cache,
-            cache_ttl_days=args.cache_ttl_days,
-        )
-        print(json.dumps(payload, indent=2, ensure_ascii=False))
+        with OeisCache(args.cache_db) as cache:
+            payloads = oeis_fetch_by_ids_online(
+                args.a_numbers,
+                oeis_base=args.oeis_base,
+                timeout=args.timeout,
+                cache=cache,
+                cache_ttl_days=args.cache_ttl_days,
+            )
+        if len(payloads) == 1:
+            print(json_dumps(payloads[0], indent=True))
+        else:
+            by_id = {a.upper().strip(): p for a, p in zip(args.a_numbers, payloads, strict=True)}
+            print(json_dumps(by_id, indent=True))
+        return 0
+
+    if args.cmd == "build-index":
+        n = build_stripped_index(args.stripped, args.index)
+        print(f"indexed {n} sequences -> {args.index}")
         return 0
 
     # probe
@@ -198,33 +282,59 @@ def main(argv: Sequence[str] | None = None) -> int:
         terms = parse_terms(args.terms)
 
     min_match_len = max(1, int(args.min_match_len))
+    if args.offline_index_cache and args.offline_index is None:
+        args.offline_index = args.cache_db
+    if args.offline_unpack and args.offline_stripped and not args.offline_index:
+        args.offline_stripped = materialize_stripped(args.offline_stripped, args.cache_db.parent)
 
     cache = OeisCache(args.cache_db)
 
-    online_hits = []
-    online_err = None
-    if not args.no_online:
-        online_hits, online_err = _online_probe_with_optional_relax(
-            terms,
-            oeis_base=args.oeis_base,
-            timeout=args.timeout,
-            cache=cache,
-            cache_ttl_days=args.cache_ttl_days,
-            max_query_terms=args.max_query_terms,
-            max_hits=args.max_hits,
-            relax_online=bool(args.relax_online),
-            relax_min_terms=max(1, int(args.relax_min_terms)),
-        )
-
-    offline_hits = []
-    if args.offline_stripped:
-        offline_hits = oeis_search_offline_stripped(
-            terms,
-            args.offline_stripped,
-            names_path=args.offline_names,
-            max_hits=args.max_hits,
-            max_scan=args.offline_max_scan,
-        )
+    offline_min_prefix = max(1, int(args.relax_min_terms)) if args.relax_offline else None
+
+    # the online lookup (network-bound) and the offline scan (inflate/IO-bound) overlap
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="oeis-probe") as pool:
+        online_future = None
+        if not args.no_online:
+            online_future = pool.submit(
+                _online_probe_with_optional_relax,
+                terms,
+                oeis_base=args.oeis_base,
+                timeout=args.timeout,
+                cache=cache,
+                cache_ttl_days=args.cache_ttl_days,
+                max_query_terms=args.max_query_terms,
+                max_hits=args.max_hits,
+                relax_online=bool(args.relax_online),
+                relax_min_terms=max(1, int(args.relax_min_terms)),
+            )
+
+        offline_future = None
+        if args.offline_index:
+            offline_future = pool.submit(
+                oeis_search_offline_index,
+                terms,
+                args.offline_index,
+                names_path=args.offline_names,
+                max_hits=args.max_hits,
+                min_prefix=offline_min_prefix,
+            )
+        elif args.offline_stripped:
+            offline_future = pool.submit(
+                oeis_search_offline_stripped,
+                terms,
+                args.offline_stripped,
+                names_path=args.offline_names,
+                max_hits=args.max_hits,
+                max_scan=args.offline_max_scan,
+                min_prefix=offline_min_prefix,
+                workers=max(1, int(args.offline_workers)),
+            )
+
+        online_hits, online_err = [], None
+        if online_future is not None:
+            online_hits, online_err = online_future.result()
+        offline_hits = offline_future.result() if offline_future is not None else []
+    cache.close()
 
     merged = {h.a_number: h for h in offline_hits}
     for h in online_hits:
@@ -234,7 +344,7 @@ def main(argv: Sequence[str] | None = None) -> int:
 
     filtered = [h for h in merged.values() if h.match_len >= min_match_len]
 
-    merged_hits = sort_hits(filtered, rank=args.rank)[: args.max_hits]
+    merged_hits = sort_hits(filtered, rank=args.rank, limit=args.max_hits)
 
     pretty_print_hits(terms, merged_hits)
 
@@ -248,14 +358,15 @@ def main(argv: Sequence[str] | None = None) -> int:
         result = {
             "query_terms": terms,
             "online_enabled": (not args.no_online),
-            "offline_enabled": bool(args.offline_stripped),
+            "offline_enabled": bool(args.offline_stripped or args.offline_index),
             "rank": args.rank,
             "min_match_len": min_match_len,
             "relax_online": bool(args.relax_online),
+            "relax_offline": bool(args.relax_offline),
             "relax_min_terms": int(args.relax_min_terms),
             "explain_top": bool(args.explain_top),
             "hits": hits_to_jsonable(merged_hits),
         }
-        args.json_out.write_text(json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8")
+        write_json(args.json_out, result)
 
     return 0
@@ -1,20 +1,54 @@
 from __future__ import annotations
 
+import base64
 import gzip
 import hashlib
+import heapq
+import http.client
+import itertools
 import json
+import mmap
+import multiprocessing
+import os
+import queue
 import sqlite3
 import sys
+import tempfile
+import threading
 import time
+import urllib.error
 import urllib.parse
 import urllib.request
-from collections.abc import Iterator, Sequence
-from contextlib import contextmanager
+import zlib
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from dataclasses import dataclass
+from functools import lru_cache
+from operator import attrgetter, itemgetter
 from pathlib import Path
 
+try:  # optional speed-up: pip install "oeis-probe[fast]"
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:  # optional speed-up: pip install "oeis-probe[fast]"
+    import msgspec
+except ImportError:  # pragma: no cover - depends on the environment
+    msgspec = None
+
 DEFAULT_OEIS_BASE = "https://oeis.org"
 DEFAULT_CACHE_TTL_DAYS = 30
+DEFAULT_EMPTY_CACHE_TTL_DAYS = 1
+DATA_PREFIX_TERMS = 30  # matches hits_to_jsonable's default data_prefix
+INDEX_WINDOW = 3  # terms per window key in the offline index
+SQLITE_CACHE_SIZE = -64000  # page cache for index/cache connections, in KiB (negative)
+# Offline scans are single streaming passes (each byte is inflated/searched once), so the
+# block sizes below bound memory and keep a freshly inflated chunk in cache while it is
+# searched; timings are flat from 256 KiB to 32 MiB, .gz scans being inflate-bound.
+READ_CHUNK_SIZE = 1 << 20  # stripped files are read (and inflated) in chunks this big
+MMAP_WINDOW_SIZE = 8 << 20  # plain stripped files are mapped and searched this much at a time
 
 __all__ = [
     "DEFAULT_OEIS_BASE",
@@ -25,8 +59,12 @@ __all__ = [
     "terms_to_query_string",
     "oeis_search_online",
     "oeis_fetch_by_id_online",
+    "oeis_fetch_by_ids_online",
     "hits_from_online_json",
     "oeis_search_offline_stripped",
+    "materialize_stripped",
+    "build_stripped_index",
+    "oeis_search_offline_index",
     "pretty_print_hits",
     "hits_to_jsonable",
     "best_subsequence_match",
@@ -47,6 +85,88 @@ def now_epoch() -> int:
     return int(time.time())
 
 
+def json_loads(s: str | bytes) -> object:
+    """
+    json.loads, via orjson when installed (OEIS payloads carry terms as strings, so
+    orjson's 64-bit integer limit does not apply to them).
+    """
+    if orjson is not None:
+        return orjson.loads(s)
+    return json.loads(s)
+
+
+def json_dumps(obj: object, *, indent: bool = False) -> str:
+    """
+    json.dumps(..., ensure_ascii=False), via orjson when installed.
+    Falls back to the stdlib for what orjson refuses (e.g. integers beyond 64 bits,
+    which OEIS terms often are).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False)
+
+
+if msgspec is not None:
+
+    class _OeisRecord(msgspec.Struct):
+        """The only OEIS JSON fields hits_from_online_json reads."""
+
+        number: int | str = ""
+        id: str = ""
+        name: str = ""
+        offset: str = ""
+        data: str = ""
+
+    class _OeisResults(msgspec.Struct):
+        """Wrapped format {"results": [...]}; other objects leave results unset."""
+
+        results: list[_OeisRecord] | None = None
+
+    _OEIS_RECORDS_DECODER = msgspec.json.Decoder(list[_OeisRecord] | _OeisResults | None)
+
+
+def _record_dict(r: _OeisRecord) -> dict:
+    return {"number": r.number, "id": r.id, "name": r.name, "offset": r.offset, "data": r.data}
+
+
+def json_loads_search_results(s: str | bytes) -> object:
+    """
+    Decode an OEIS search payload keeping only the fields used for ranking (via msgspec
+    when installed); anything that is not a results list is decoded like json_loads.
+    """
+    if msgspec is None:
+        return json_loads(s)
+    try:
+        obj = _OEIS_RECORDS_DECODER.decode(s)
+    except msgspec.ValidationError:
+        return json_loads(s)
+    if obj is None:
+        return None
+    if isinstance(obj, list):
+        return [_record_dict(r) for r in obj]
+    if obj.results is None:
+        return json_loads(s)
+    return {"results": [_record_dict(r) for r in obj.results]}
+
+
+def write_json(path: Path, obj: object) -> None:
+    """
+    Write obj as indented UTF-8 JSON straight to path, without building an intermediate str:
+    orjson's bytes go out as-is, the stdlib encoder streams into the file.
+    """
+    if orjson is not None:
+        try:
+            path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+            return
+        except TypeError:
+            pass
+    with path.open("w", encoding="utf-8") as fp:
+        json.dump(obj, fp, indent=2, ensure_ascii=False)
+
+
 def parse_terms(s: str) -> list[int]:
     """
     Parse "1,2,3" or "1 2 3" or "1, 2, 3" into [1,2,3].
@@ -54,40 +174,53 @@ def parse_terms(s: str) -> list[int]:
     raw = s.strip()
     if not raw:
         raise ValueError("empty terms string")
-    parts: list[str] = []
-    for chunk in raw.replace(",", " ").split():
-        parts.append(chunk)
-    terms: list[int] = []
+    parts = raw.replace(",", " ").split()
+    try:
+        return list(map(int, parts))
+    except ValueError:
+        pass
+    # slow path only to name the offending token
     for p in parts:
         try:
-            terms.append(int(p))
+            int(p)
         except ValueError as ex:
             raise ValueError(f"bad term '{p}' (expected integer)") from ex
-    return terms
+    raise AssertionError("unreachable")
+
+
+# str() of the small terms that make up most queries and OEIS prefixes, built once
+_SMALL_INT_STR = {i: str(i) for i in range(-999, 1000)}
+
+
+def _join_terms(terms: Sequence[int]) -> str:
+    """
+    ",".join(str(t) for t in terms), with small terms taken from _SMALL_INT_STR.
+    """
+    try:
+        return ",".join(map(_SMALL_INT_STR.__getitem__, terms))
+    except KeyError:
+        return ",".join([_SMALL_INT_STR.get(x) or str(x) for x in terms])
 
 
 def terms_to_query_string(terms: Sequence[int], max_terms: int | None = None) -> str:
     if max_terms is not None:
         terms = terms[:max_terms]
-    return ",".join(str(x) for x in terms)
+    return _join_terms(terms)
 
 
 @contextmanager
-def open_text_maybe_gz(path: Path):
+def open_bytes_maybe_gz(path: Path):
     """
-    Open a text file that can be plain or .gz.
+    Open a file that can be plain or .gz, in binary mode.
     """
-    if path.suffix == ".gz":
-        f = gzip.open(path, "rt", encoding="utf-8", errors="replace")
-    else:
-        f = path.open("rt", encoding="utf-8", errors="replace")
+    f = gzip.open(path, "rb") if path.suffix == ".gz" else path.open("rb")
     try:
         yield f
     finally:
         f.close()
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class OeisHit:
     a_number: str
     name: str
@@ -99,56 +232,301 @@ class OeisHit:
 
 
 class OeisCache:
+    """
+    SQLite-backed payload cache.
+
+    A single connection is kept open for the lifetime of the instance (autocommit + WAL),
+    so repeated lookups (e.g. --relax-online loops) don't reopen the DB file every time.
+    The SQL text is fixed per statement, so sqlite3's statement cache reuses the compiled
+    SELECT/UPSERT. Usable as a context manager.
+
+    Payloads are stored gzip-compressed (OEIS JSON shrinks several times over). The cache
+    table layout is tracked with PRAGMA user_version; a cache written by an older layout is
+    dropped and recreated on open (other tables in the same DB, e.g. the offline index,
+    are left alone).
+    """
+
+    SCHEMA_VERSION = 2
+    COMPRESS_LEVEL = 3
+
+    _GET_SQL = "SELECT payload, created_at FROM cache WHERE key = ? AND created_at >= ?"
+    _PUT_SQL = (
+        "INSERT INTO cache(key, created_at, payload) VALUES(?,?,?) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        "created_at = excluded.created_at, payload = excluded.payload"
+    )
+
     def __init__(self, db_path: Path) -> None:
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._con: sqlite3.Connection | None = sqlite3.connect(
+            self.db_path, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()  # one statement at a time on the shared connection
         self._init_db()
 
     def _init_db(self) -> None:
-        with sqlite3.connect(self.db_path) as con:
-            con.execute(
-                """
-                CREATE TABLE IF NOT EXISTS cache (
-                    key TEXT PRIMARY KEY,
-                    created_at INTEGER NOT NULL,
-                    payload TEXT NOT NULL
-                )
-                """
+        con = self._con
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute("PRAGMA temp_store=MEMORY")
+        con.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        (version,) = con.execute("PRAGMA user_version").fetchone()
+        if version < self.SCHEMA_VERSION:
+            con.execute("DROP TABLE IF EXISTS cache")
+            con.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                created_at INTEGER NOT NULL,
+                payload BLOB NOT NULL
             )
-            con.commit()
+            """
+        )
+
+    def close(self) -> None:
+        con, self._con = self._con, None
+        if con is not None:
+            con.close()
+
+    def __enter__(self) -> OeisCache:
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:  # noqa: BLE001
+            pass
 
     def get(self, key: str, ttl_days: int) -> str | None:
+        entry = self.get_entry(key, ttl_days)
+        return None if entry is None else entry[0]
+
+    def get_entry(self, key: str, ttl_days: int) -> tuple[str, int] | None:
+        """
+        (payload, created_at) if key is cached and younger than ttl_days, else None.
+        """
         cutoff = now_epoch() - ttl_days * 86400
-        with sqlite3.connect(self.db_path) as con:
-            row = con.execute(
-                "SELECT created_at, payload FROM cache WHERE key = ?",
-                (key,),
-            ).fetchone()
+        with self._lock:
+            row = self._con.execute(self._GET_SQL, (key, cutoff)).fetchone()
         if not row:
             return None
-        created_at, payload = int(row[0]), str(row[1])
-        if created_at < cutoff:
-            return None
-        return payload
+        return gzip.decompress(row[0]).decode("utf-8"), row[1]
 
     def put(self, key: str, payload: str) -> None:
-        with sqlite3.connect(self.db_path) as con:
-            con.execute(
-                "INSERT OR REPLACE INTO cache(key, created_at, payload) VALUES(?,?,?)",
-                (key, now_epoch(), payload),
-            )
-            con.commit()
+        blob = gzip.compress(payload.encode("utf-8"), compresslevel=self.COMPRESS_LEVEL)
+        with self._lock:
+            self._con.execute(self._PUT_SQL, (key, now_epoch(), blob))
+
+
+# Idle keep-alive connections per (scheme, netloc, proxy), so repeated OEIS calls skip the
+# TCP + TLS handshake. Connections are checked out while in use, so threads never share one.
+_HTTP_POOL: dict[tuple[str, str, str | None], list[http.client.HTTPConnection]] = {}
+_HTTP_POOL_LOCK = threading.Lock()
+HTTP_POOL_MAXSIZE = 4
+HTTP_RETRIES = 3  # for 429/5xx answers and connect/read failures, with exponential backoff
+HTTP_BACKOFF = 0.3
+HTTP_MAX_RETRY_AFTER = 30.0  # cap on a server-requested Retry-After wait, in seconds
+_HTTP_RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+_HTTP_MAX_REDIRECTS = 5
+
+
+def _http_proxy(scheme: str, host: str) -> tuple[str, dict[str, str]] | None:
+    """
+    (proxy netloc, extra proxy headers) for a request, or None for a direct connection.
+
+    Follows the same environment as urlopen's default opener: http_proxy / https_proxy
+    (user:password@ in the proxy URL becomes Basic proxy auth) and no_proxy.
+    """
+    proxy = urllib.request.getproxies().get(scheme)
+    if not proxy or urllib.request.proxy_bypass(host):
+        return None
+    if "://" not in proxy:
+        proxy = f"http://{proxy}"
+    p = urllib.parse.urlsplit(proxy)
+    headers = {}
+    if p.username is not None:
+        creds = f"{urllib.parse.unquote(p.username)}:{urllib.parse.unquote(p.password or '')}"
+        headers["Proxy-Authorization"] = "Basic " + base64.b64encode(creds.encode()).decode()
+    return p.netloc.rpartition("@")[2], headers
+
+
+def _http_pool_key(
+    scheme: str, netloc: str, proxy: tuple[str, dict[str, str]] | None
+) -> tuple[str, str, str | None]:
+    return scheme, netloc, None if proxy is None else proxy[0]
+
+
+def _http_conn_checkout(
+    scheme: str, netloc: str, proxy: tuple[str, dict[str, str]] | None, timeout: float
+) -> http.client.HTTPConnection:
+    with _HTTP_POOL_LOCK:
+        idle = _HTTP_POOL.get(_http_pool_key(scheme, netloc, proxy))
+        conn = idle.pop() if idle else None
+    if conn is None:
+        if proxy is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            return cls(netloc, timeout=timeout)
+        proxy_netloc, proxy_headers = proxy
+        if scheme == "http":
+            # plain HTTP goes to the proxy with the absolute URL as request target
+            return http.client.HTTPConnection(proxy_netloc, timeout=timeout)
+        conn = http.client.HTTPSConnection(proxy_netloc, timeout=timeout)
+        conn.set_tunnel(netloc, headers=proxy_headers)  # CONNECT, then TLS to the origin
+        return conn
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn
+
+
+def _http_conn_checkin(
+    scheme: str,
+    netloc: str,
+    proxy: tuple[str, dict[str, str]] | None,
+    conn: http.client.HTTPConnection,
+) -> None:
+    with _HTTP_POOL_LOCK:
+        idle = _HTTP_POOL.setdefault(_http_pool_key(scheme, netloc, proxy), [])
+        if len(idle) < HTTP_POOL_MAXSIZE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+def close_http_pool() -> None:
+    """
+    Close all idle keep-alive connections.
+    """
+    with _HTTP_POOL_LOCK:
+        conns = [c for idle in _HTTP_POOL.values() for c in idle]
+        _HTTP_POOL.clear()
+    for c in conns:
+        c.close()
+
+
+def _retry_delay(retry_after: str | None, attempt: int) -> float:
+    delay = HTTP_BACKOFF * (2**attempt)
+    if retry_after and retry_after.strip().isdigit():
+        # be polite when OEIS says how long to back off (HTTP-date values are ignored)
+        delay = max(delay, min(float(retry_after), HTTP_MAX_RETRY_AFTER))
+    return delay
+
+
+def http_get_text(url: str, timeout: float = 10.0, user_agent: str = "oeis-probe/0.1") -> str:
+    headers = {
+        "User-Agent": user_agent,
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",  # OEIS JSON compresses ~5-10x
+    }
+    for _ in range(_HTTP_MAX_REDIRECTS + 1):
+        parts = urllib.parse.urlsplit(url)
+        scheme, netloc = parts.scheme.lower(), parts.netloc
+        if scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {url}")
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        proxy = _http_proxy(scheme, parts.hostname or "")
+        req_headers = headers
+        if proxy is not None and scheme == "http":
+            path = urllib.parse.urlunsplit((scheme, netloc, path, "", ""))
+            req_headers = {**headers, **proxy[1]}
+
+        attempt = 0
+        while True:
+            conn = _http_conn_checkout(scheme, netloc, proxy, timeout)
+            reused = conn.sock is not None
+            try:
+                conn.request("GET", path, headers=req_headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError) as ex:
+                conn.close()
+                if reused:
+                    # the server dropped an idle keep-alive connection: retry on a fresh one
+                    continue
+                if attempt < HTTP_RETRIES:
+                    # connect/read failures are retried with the same backoff as 429/5xx
+                    time.sleep(_retry_delay(None, attempt))
+                    attempt += 1
+                    continue
+                # same exception type urlopen raised for transport failures
+                raise urllib.error.URLError(ex) from ex
+            except BaseException:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                _http_conn_checkin(scheme, netloc, proxy, conn)
+            if resp.status in _HTTP_RETRY_STATUS and attempt < HTTP_RETRIES:
+                time.sleep(_retry_delay(resp.getheader("Retry-After"), attempt))
+                attempt += 1
+                continue
+            break
+
+        location = resp.getheader("Location")
+        if resp.status in (301, 302, 303, 307, 308) and location:
+            url = urllib.parse.urljoin(url, location)
+            continue
+        if resp.status >= 400:
+            raise urllib.error.HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return body.decode("utf-8", errors="replace")
+    raise urllib.error.URLError(f"too many redirects: {url}")
 
 
 def http_get_json(url: str, timeout: float = 10.0, user_agent: str = "oeis-probe/0.1") -> object:
-    req = urllib.request.Request(
-        url,
-        headers={"User-Agent": user_agent, "Accept": "application/json"},
-        method="GET",
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        data = resp.read().decode("utf-8", errors="replace")
-    return json.loads(data)
+    return json_loads(http_get_text(url, timeout=timeout, user_agent=user_agent))
+
+
+@lru_cache(maxsize=256)
+def _request_key(url: str) -> str:
+    return sha256_hex(f"GET:{url}")
+
+
+@lru_cache(maxsize=128)
+def _search_url(q_terms: tuple[int, ...], oeis_base: str) -> str:
+    q = urllib.parse.quote(terms_to_query_string(q_terms), safe=",")
+    return f"{oeis_base}/search?q={q}&fmt=json"
+
+
+def _cached_get_json(
+    url: str,
+    *,
+    timeout: float,
+    cache: OeisCache | None,
+    cache_ttl_days: int,
+    decode: Callable[[str], object] = json_loads,
+) -> object:
+    """
+    GET a JSON url through the cache. The raw response text is what gets stored,
+    so a miss costs one parse and no re-serialization.
+
+    "No results" answers are cached too (--relax-online produces many of them), but
+    expire after DEFAULT_EMPTY_CACHE_TTL_DAYS since new OEIS entries can turn them into hits.
+    """
+    key = _request_key(url)
+    if cache is not None:
+        entry = cache.get_entry(key, ttl_days=cache_ttl_days)
+        if entry is not None:
+            cached, created_at = entry
+            payload = decode(cached)
+            empty_ttl_days = min(cache_ttl_days, DEFAULT_EMPTY_CACHE_TTL_DAYS)
+            if (
+                _oeis_results_from_payload(payload)
+                or created_at >= now_epoch() - empty_ttl_days * 86400
+            ):
+                return payload
+    text = http_get_text(url, timeout=timeout)
+    payload = decode(text)
+    if cache is not None:
+        cache.put(key, text)
+    return payload
 
 
 def oeis_search_online(
@@ -159,19 +537,21 @@ def oeis_search_online(
     timeout: float = 10.0,
     cache: OeisCache | None = None,
     cache_ttl_days: int = DEFAULT_CACHE_TTL_DAYS,
+    minimal: bool = False,
 ) -> object:
-    q_terms = terms_to_query_string(terms, max_terms=max_query_terms)
-    q = urllib.parse.quote(q_terms, safe=",")
-    url = f"{oeis_base}/search?q={q}&fmt=json"
-    key = f"GET:{url}"
-    if cache is not None:
-        cached = cache.get(sha256_hex(key), ttl_days=cache_ttl_days)
-        if cached is not None:
-            return json.loads(cached)
-    payload = http_get_json(url, timeout=timeout)
-    if cache is not None:
-        cache.put(sha256_hex(key), json.dumps(payload))
-    return payload
+    """
+    OEIS search by terms. With minimal=True the payload only carries the record fields
+    hits_from_online_json needs (see json_loads_search_results); the cache keeps the full
+    response either way.
+    """
+    url = _search_url(tuple(terms[:max_query_terms]), oeis_base)
+    return _cached_get_json(
+        url,
+        timeout=timeout,
+        cache=cache,
+        cache_ttl_days=cache_ttl_days,
+        decode=json_loads_search_results if minimal else json_loads,
+    )
 
 
 def oeis_fetch_by_id_online(
@@ -182,30 +562,61 @@ def oeis_fetch_by_id_online(
     cache: OeisCache | None = None,
     cache_ttl_days: int = DEFAULT_CACHE_TTL_DAYS,
 ) -> object:
+    url = _fetch_url(a_number, oeis_base)
+    return _cached_get_json(url, timeout=timeout, cache=cache, cache_ttl_days=cache_ttl_days)
+
+
+def oeis_fetch_by_ids_online(
+    a_numbers: Sequence[str],
+    *,
+    oeis_base: str = DEFAULT_OEIS_BASE,
+    timeout: float = 10.0,
+    cache: OeisCache | None = None,
+    cache_ttl_days: int = DEFAULT_CACHE_TTL_DAYS,
+    workers: int = HTTP_POOL_MAXSIZE,
+) -> list[object]:
+    """
+    oeis_fetch_by_id_online for several A-numbers, payloads in input order.
+
+    Up to `workers` requests are in flight at once, each on its own pooled keep-alive
+    connection, so N uncached lookups cost about N / workers round trips instead of N.
+    All A-numbers are validated before anything is fetched.
+    """
+    urls = [_fetch_url(a, oeis_base) for a in a_numbers]
+
+    def fetch(url: str) -> object:
+        return _cached_get_json(url, timeout=timeout, cache=cache, cache_ttl_days=cache_ttl_days)
+
+    if workers <= 1 or len(urls) <= 1:
+        return [fetch(u) for u in urls]
+    with ThreadPoolExecutor(max_workers=min(workers, len(urls))) as pool:
+        return list(pool.map(fetch, urls))
+
+
+def _fetch_url(a_number: str, oeis_base: str) -> str:
     a_number = a_number.upper().strip()
     if not a_number.startswith("A") or len(a_number) != 7:
         raise ValueError("expected A-number like A000045")
     q = urllib.parse.quote(f"id:{a_number}")
-    url = f"{oeis_base}/search?q={q}&fmt=json"
-    key = f"GET:{url}"
-    if cache is not None:
-        cached = cache.get(sha256_hex(key), ttl_days=cache_ttl_days)
-        if cached is not None:
-            return json.loads(cached)
-    payload = http_get_json(url, timeout=timeout)
-    if cache is not None:
-        cache.put(sha256_hex(key), json.dumps(payload))
-    return payload
+    return f"{oeis_base}/search?q={q}&fmt=json"
 
 
 def parse_oeis_data_terms(data_field: str, max_terms: int = 200) -> list[int]:
     """
     OEIS JSON 'data' is a comma-separated string of integers.
+    Only the first max_terms tokens are split off; the tail of long series is never touched.
     """
-    s = data_field.strip()
+    s = data_field.strip().strip(",")
     if not s:
         return []
-    items = [x.strip() for x in s.split(",")]
+    items = s.split(",", max_terms)
+    if len(items) > max_terms:
+        items.pop()  # unsplit tail
+    try:
+        # well-formed fields (the norm) convert in one C-level pass; int() ignores spaces
+        return list(map(int, items))
+    except ValueError:
+        pass
     out: list[int] = []
     for it in items:
         if not it:
@@ -219,28 +630,69 @@ def parse_oeis_data_terms(data_field: str, max_terms: int = 200) -> list[int]:
     return out
 
 
-def best_subsequence_match(hay: Sequence[int], needle: Sequence[int]) -> tuple[int, int | None]:
+def _comma_wrap(terms: Sequence[int]) -> str:
+    """
+    [1, 2, 3] -> ",1,2,3," (same layout as a stripped line, so substring == consecutive match).
+    """
+    return "," + _join_terms(terms) + ","
+
+
+@lru_cache(maxsize=64)
+def _prefix_ends(needle_s: str) -> tuple[int, ...]:
+    """
+    ends[k] = end offset (exclusive) of the comma-wrapped k-term prefix of needle_s.
+    Memoized: a probe matches one needle against many data lines.
+    """
+    return tuple(i + 1 for i, ch in enumerate(needle_s) if ch == ",")
+
+
+def _best_match_str(hay_s: str, needle_s: str) -> tuple[int, int | None]:
+    """
+    best_subsequence_match on comma-wrapped strings (see _comma_wrap).
+
+    If a prefix of length k occurs in hay, every shorter prefix does too, so the longest
+    matching prefix is found by binary search on k, each probe being one C-level str.find.
+    """
+    if len(needle_s) < 3 or len(hay_s) < 3:
+        return 0, None
+
+    # cheap exits first: the whole needle (the usual case for real hits), then its first
+    # term alone (if that is absent no start position can match at all)
+    find = hay_s.find
+    pos = find(needle_s)
+    if pos >= 0:
+        return needle_s.count(",") - 1, hay_s.count(",", 0, pos)
+    ends = _prefix_ends(needle_s)
+    pos = find(needle_s[: ends[1]])
+    if pos < 0:
+        return 0, None
+
+    lo, hi = 1, len(ends) - 2
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        p = find(needle_s[: ends[mid]])
+        if p >= 0:
+            lo, pos = mid, p
+        else:
+            hi = mid - 1
+    # lo only moves on a successful probe, so pos is the earliest occurrence of that prefix
+    return lo, hay_s.count(",", 0, pos)
+
+
+def best_subsequence_match(
+    hay: Sequence[int] | str, needle: Sequence[int] | str
+) -> tuple[int, int | None]:
     """
     Find best consecutive match length of needle inside hay.
     Returns (match_len, match_at_index_in_hay).
+    Either side may also be passed already comma-wrapped (",t1,t2,...,", as in stripped)
+    to skip the int -> str conversion.
     """
     if not needle or not hay:
         return 0, None
-    best_len = 0
-    best_at: int | None = None
-    n = len(needle)
-    for start in range(len(hay)):
-        if len(hay) - start <= best_len:
-            break
-        k = 0
-        while start + k < len(hay) and k < n and hay[start + k] == needle[k]:
-            k += 1
-        if k > best_len:
-            best_len = k
-            best_at = start
-        if best_len == n:
-            break
-    return best_len, best_at
+    hay_s = hay if isinstance(hay, str) else _comma_wrap(hay)
+    needle_s = needle if isinstance(needle, str) else _comma_wrap(needle)
+    return _best_match_str(hay_s, needle_s)
 
 
 def _oeis_results_from_payload(payload: object) -> list:
@@ -262,69 +714,309 @@ def _oeis_results_from_payload(payload: object) -> list:
     return []
 
 
+def _score_line(hay_s: str, needle_s: str, n_terms: int) -> tuple[int, int | None, float]:
+    """
+    Rank a comma-wrapped data line against a comma-wrapped needle without int-parsing it.
+    Returns (match_len, match_at, score).
+    """
+    mlen, mat = _best_match_str(hay_s, needle_s)
+    n_data = hay_s.count(",") - 1 if len(hay_s) > 2 else 0
+    denom = max(1, min(n_terms, n_data))
+    return mlen, mat, mlen / denom
+
+
+def _data_prefix(hay_s: str, mlen: int, mat: int | None) -> list[int]:
+    """
+    The data terms output and --explain-top can show: DATA_PREFIX_TERMS, or up to one
+    term past the match.
+    """
+    return parse_oeis_data_terms(hay_s, max_terms=max(DATA_PREFIX_TERMS, (mat or 0) + mlen + 1))
+
+
+def _online_a_number(r: dict) -> str:
+    a = r.get("number") or ""
+    if isinstance(a, int) or (isinstance(a, str) and a.strip().isdigit()):
+        return f"A{int(a):06d}"
+    return (r.get("id") or "").strip() or "A??????"
+
+
+# (record or A-number, data line, match_len, match_at, score) -> (score, match_len), like _strict_key
+_scored_rank_key = itemgetter(4, 2)
+
+
 def hits_from_online_json(
     terms: Sequence[int], payload: object, max_hits: int = 10
 ) -> list[OeisHit]:
+    """
+    Rank an OEIS search payload against terms, best max_hits first (strict ranking).
+
+    Every record is scored on its raw data string first; data parsing and OeisHit
+    creation then only happen for the records that make the cut.
+    """
     results = _oeis_results_from_payload(payload)
-    needle = list(terms)
-    hits: list[OeisHit] = []
+    needle_s = _comma_wrap(terms)
+    n_terms = len(terms)
 
+    scored = []
     for r in results[: max_hits * 3]:
         if not isinstance(r, dict):
             continue
-
-        a = r.get("number") or ""
-        if isinstance(a, int) or (isinstance(a, str) and a.strip().isdigit()):
-            a_number = f"A{int(a):06d}"
-        else:
-            a_number = (r.get("id") or "").strip() or "A??????"
-
-        name = (r.get("name") or "").strip()
-        offset = (r.get("offset") or "").strip()
-        data_terms = parse_oeis_data_terms(r.get("data", ""), max_terms=400)
-
-        mlen, mat = best_subsequence_match(data_terms, needle)
-        denom = max(1, min(len(needle), len(data_terms)))
-        score = mlen / denom
-
-        hits.append(
-            OeisHit(
-                a_number=a_number,
-                name=name,
-                offset=offset,
-                data_terms=data_terms,
-                match_len=mlen,
-                match_at=mat,
-                score=score,
-            )
+        hay_s = "," + (r.get("data") or "").replace(" ", "").strip(",") + ","
+        scored.append((r, hay_s, *_score_line(hay_s, needle_s, n_terms)))
+
+    # same selection and tie order as sort_hits(..., limit=max_hits) on the full list
+    best = heapq.nlargest(max(0, max_hits), scored, key=_scored_rank_key)
+    return [
+        OeisHit(
+            a_number=_online_a_number(r),
+            name=(r.get("name") or "").strip(),
+            offset=(r.get("offset") or "").strip(),
+            data_terms=_data_prefix(hay_s, mlen, mat),
+            match_len=mlen,
+            match_at=mat,
+            score=score,
         )
-
-    return sort_hits(hits, rank="strict")[:max_hits]
+        for r, hay_s, mlen, mat, score in best
+    ]
 
 
 def load_names_map(names_path: Path, limit: int | None = None) -> dict:
     """
     Load names.gz or names into {Axxxxxx: name}.
+    The file is split into lines as bytes; only the kept names are decoded.
     """
     names: dict = {}
-    with open_text_maybe_gz(names_path) as f:
-        for line in f:
-            if not line or line.startswith("#"):
+    for block in _iter_line_blocks(names_path):
+        for line in block.split(b"\n"):
+            if not line or line[:1] == b"#":
                 continue
-            line = line.rstrip("\n")
-            if not line:
-                continue
-            parts = line.split(" ", 1)
+            parts = line.split(b" ", 1)
             if len(parts) != 2:
                 continue
-            aid, nm = parts[0].strip(), parts[1].strip()
-            if aid.startswith("A") and len(aid) == 7:
-                names[aid] = nm
+            aid = parts[0].strip()
+            if aid[:1] == b"A" and len(aid) == 7:
+                names[aid.decode("ascii")] = parts[1].strip().decode("utf-8", errors="replace")
             if limit is not None and len(names) >= limit:
-                break
+                return names
     return names
 
 
+def _iter_read_ahead(f, chunk_size: int, depth: int = 4) -> Iterator:
+    """
+    Yield f.read(chunk_size) chunks until EOF, reading in a background thread.
+
+    For .gz inputs the inflate work (zlib releases the GIL) then overlaps with whatever
+    the caller does with the previous chunk. Close the generator before closing f.
+    """
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item: object) -> None:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def worker() -> None:
+        try:
+            while not stop.is_set():
+                chunk = f.read(chunk_size)
+                put(chunk)
+                if not chunk:
+                    return
+        except BaseException as ex:  # noqa: BLE001
+            put(ex)
+
+    t = threading.Thread(target=worker, name="oeis-probe-read-ahead", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if isinstance(item, BaseException):
+                raise item
+            if not item:
+                return
+            yield item
+    finally:
+        stop.set()
+        t.join()
+
+
+def _iter_line_blocks(path: Path) -> Iterator[bytes]:
+    """
+    Yield the raw content of a plain or .gz file (stripped, names) as blocks of whole
+    lines (each block ends with b"\n"), roughly READ_CHUNK_SIZE bytes each.
+    """
+    with (
+        open_bytes_maybe_gz(path) as f,
+        closing(_iter_read_ahead(f, READ_CHUNK_SIZE)) as chunks,
+    ):
+        tail = b""
+        for chunk in chunks:
+            cut = chunk.rfind(b"\n") + 1
+            if cut == 0:
+                tail += chunk
+                continue
+            yield tail + chunk[:cut] if tail else chunk[:cut]
+            tail = chunk[cut:]
+        if tail:
+            yield tail + b"\n"
+
+
+def _iter_stripped_records(stripped_path: Path) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Bytes-level iter_stripped_lines: yield (b"Axxxxxx", b",t1,t2,...,") records.
+
+    stripped is plain ASCII, so lines are split out of large binary blocks and nothing is
+    decoded here; callers decode only the records they keep.
+    """
+    for block in _iter_line_blocks(stripped_path):
+        for line in block.split(b"\n"):
+            rec = _parse_stripped_line(line)
+            if rec is not None:
+                yield rec
+
+
+def _iter_block_matches(
+    buf: bytes | mmap.mmap, needle_b: bytes, start: int, stop: int
+) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Yield the stripped records containing needle_b among the whole lines in buf[start:stop].
+    """
+    if buf.find(b" ", start, stop) >= 0:
+        # terms only match once spaces are gone (stock OEIS files have one after the
+        # A-number); space-free regions, e.g. from materialize_stripped, are searched in place
+        buf = buf[start:stop].replace(b" ", b"")
+        start, stop = 0, len(buf)
+
+    pos = buf.find(needle_b, start, stop)
+    while pos >= 0:
+        line_start = buf.rfind(b"\n", start, pos) + 1 or start
+        line_end = buf.find(b"\n", pos, stop)
+        if line_end < 0:
+            line_end = stop
+        rec = _parse_stripped_line(buf[line_start:line_end])
+        if rec is not None and needle_b in rec[1]:
+            yield rec
+        pos = buf.find(needle_b, line_end, stop)
+
+
+def _iter_mmap_matches(
+    stripped_path: Path, needle_b: bytes, max_scan: int | None = None
+) -> Iterator[tuple[bytes, bytes]]:
+    """
+    _iter_stripped_matches for an uncompressed file, mapped and scanned in
+    MMAP_WINDOW_SIZE windows. Windows containing spaces (every line of a stock OEIS file)
+    are copied once without them; space-free files are searched in place.
+    """
+    with stripped_path.open("rb") as f:
+        if stripped_path.stat().st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            if max_scan is not None:
+                end = -1
+                for _ in range(max_scan):
+                    end = mm.find(b"\n", end + 1)
+                    if end < 0:
+                        end = size - 1
+                        break
+                size = end + 1
+            pos = 0
+            while pos < size:
+                stop = mm.find(b"\n", min(pos + MMAP_WINDOW_SIZE, size - 1), size) + 1 or size
+                yield from _iter_block_matches(mm, needle_b, pos, stop)
+                pos = stop
+
+
+def _scan_range_worker(
+    path_str: str, needle_b: bytes, start: int, stop: int, cap: int | None
+) -> list[tuple[bytes, bytes]]:
+    # runs in a worker process: each one maps the file itself, nothing big is pickled
+    with open(path_str, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return list(itertools.islice(_iter_block_matches(mm, needle_b, start, stop), cap))
+
+
+def _parallel_mmap_matches(
+    stripped_path: Path, needle_b: bytes, workers: int, cap: int | None
+) -> list[tuple[bytes, bytes]]:
+    """
+    Matches of an uncompressed stripped file, scanned by `workers` processes over
+    newline-aligned byte ranges. Results are concatenated in range order, so they come out
+    in file order exactly like the serial scan (each range keeps at most `cap` matches).
+    """
+    size = stripped_path.stat().st_size
+    if size == 0:
+        return []
+    with stripped_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, workers):
+            b = mm.find(b"\n", max(bounds[-1], size * i // workers)) + 1 or size
+            bounds.append(b)
+        bounds.append(size)
+    ranges = [(a, b) for a, b in itertools.pairwise(bounds) if a < b]
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=ctx) as pool:
+        futures = [
+            pool.submit(_scan_range_worker, str(stripped_path), needle_b, a, b, cap)
+            for a, b in ranges
+        ]
+        return [rec for fut in futures for rec in fut.result()]
+
+
+def _iter_stripped_matches(
+    stripped_path: Path, needle_b: bytes, max_scan: int | None = None
+) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Yield the stripped records containing needle_b, in file order.
+    Plain files are searched through mmap, .gz files block by block as they inflate.
+    max_scan stops after that many raw lines.
+    """
+    if stripped_path.suffix != ".gz":
+        yield from _iter_mmap_matches(stripped_path, needle_b, max_scan)
+        return
+
+    scanned = 0
+    for block in _iter_line_blocks(stripped_path):
+        stop = False
+        if max_scan is not None:
+            n = block.count(b"\n")
+            if scanned + n >= max_scan:
+                end = -1
+                for _ in range(max_scan - scanned):
+                    end = block.find(b"\n", end + 1)
+                block = block[: end + 1]
+                stop = True
+            scanned += n
+
+        yield from _iter_block_matches(block, needle_b, 0, len(block))
+
+        if stop:
+            return
+
+
+def _parse_stripped_line(line: bytes) -> tuple[bytes, bytes] | None:
+    """
+    b"A000045 ,0,1,1,2," -> (b"A000045", b",0,1,1,2,"). Spaces anywhere are ignored, so a
+    line gives the same record whether or not its region was already space-stripped.
+    """
+    if b" " in line:
+        line = line.replace(b" ", b"")
+    line = line.strip()
+    if not line or line[:1] == b"#":
+        return None
+    aid = line[:7]
+    if not (aid[:1] == b"A" and aid[1:].isdigit() and len(aid) == 7):
+        return None
+    rest = line[7:].lstrip()
+    if not rest or rest[:1].isdigit():  # no terms, or not a 6-digit A-number
+        return None
+    return aid, rest
+
+
 def iter_stripped_lines(stripped_path: Path) -> Iterator[tuple[str, str]]:
     """
     Yield (Axxxxxx, normalized_terms_string) for each line in stripped/stripped.gz.
@@ -332,21 +1024,106 @@ def iter_stripped_lines(stripped_path: Path) -> Iterator[tuple[str, str]]:
     Example stripped line:
         A000001 ,0,1,1,1,2,1,...
     """
-    with open_text_maybe_gz(stripped_path) as f:
-        for line in f:
-            if not line or line.startswith("#"):
-                continue
-            line = line.strip("\n")
-            if not line:
-                continue
-            parts = line.split(None, 1)
-            if len(parts) < 2:
-                continue
-            aid = parts[0].strip()
-            rest = parts[1].strip().replace(" ", "")
-            if not (aid.startswith("A") and len(aid) == 7):
-                continue
-            yield aid, rest
+    for aid, rest in _iter_stripped_records(stripped_path):
+        yield aid.decode("ascii", errors="replace"), rest.decode("ascii", errors="replace")
+
+
+@lru_cache(maxsize=4)
+def _load_names_cached(path_str: str, mtime_ns: int, size: int) -> dict:
+    # mtime/size are part of the key so a refreshed names.gz is reloaded
+    return load_names_map(Path(path_str))
+
+
+def _load_names_or_warn(names_path: Path | None) -> dict:
+    """
+    Names map for offline hits, parsed once per process per file version.
+    The returned dict is shared between calls: treat it as read-only.
+    """
+    if names_path is None or not names_path.exists():
+        return {}
+    try:
+        st = names_path.stat()
+        return _load_names_cached(str(names_path.resolve()), st.st_mtime_ns, st.st_size)
+    except Exception as ex:
+        eprint(f"[warn] couldn't load names file: {ex}")
+        return {}
+
+
+# partial (min_prefix) searches keep the longest query prefixes: a short sequence fully
+# covered (score 1.0) must not push out a longer prefix match
+_prefix_rank_key = itemgetter(2, 4)
+
+
+def _offline_top_hits(
+    scored: list[tuple[str, str, int, int | None, float]],
+    names: dict,
+    max_hits: int,
+    *,
+    by_prefix: bool = False,
+) -> list[OeisHit]:
+    """
+    Best max_hits of (aid, rest, match_len, match_at, score) records as OeisHits, ranked
+    like sort_hits (by_prefix: by match_len, then score). Only kept records get data terms.
+    """
+    key = _prefix_rank_key if by_prefix else _scored_rank_key
+    best = heapq.nlargest(max(0, max_hits), scored, key=key)
+    return [
+        OeisHit(
+            a_number=aid,
+            name=names.get(aid, ""),
+            offset="",
+            data_terms=_data_prefix(rest, mlen, mat),
+            match_len=mlen,
+            match_at=mat,
+            score=score,
+        )
+        for aid, rest, mlen, mat, score in best
+    ]
+
+
+def _offline_filter_len(terms: Sequence[int], min_prefix: int | None) -> int:
+    if min_prefix is None:
+        return len(terms)
+    return max(1, min(min_prefix, len(terms)))
+
+
+def materialize_stripped(stripped_path: Path, cache_dir: Path) -> Path:
+    """
+    Return an uncompressed, space-free copy of stripped.gz kept in cache_dir
+    (rebuilt when the source changes). Plain inputs are returned as-is.
+    """
+    if stripped_path.suffix != ".gz":
+        return stripped_path
+    source = stripped_path.resolve()
+    st = source.stat()
+    stamp = {"source": str(source), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    dest = cache_dir / f"{stripped_path.stem}.{sha256_hex(str(source))[:16]}.plain"
+    stamp_path = dest.with_name(dest.name + ".json")
+    try:
+        if dest.exists() and json_loads(stamp_path.read_bytes()) == stamp:
+            return dest
+    except (OSError, ValueError):
+        pass
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=cache_dir, suffix=".tmp", delete=False) as out:
+        tmp = Path(out.name)
+        try:
+            with gzip.open(source, "rb") as src:
+                for chunk in iter(lambda: src.read(READ_CHUNK_SIZE), b""):
+                    # lines parse the same without spaces, and the scan then runs in place
+                    out.write(chunk.replace(b" ", b""))
+        except BaseException:
+            out.close()
+            tmp.unlink(missing_ok=True)
+            raise
+    os.replace(tmp, dest)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=cache_dir, suffix=".tmp", delete=False, encoding="utf-8"
+    ) as out:
+        out.write(json_dumps(stamp))
+    os.replace(out.name, stamp_path)
+    return dest
 
 
 def oeis_search_offline_stripped(
@@ -356,54 +1133,204 @@ def oeis_search_offline_stripped(
     names_path: Path | None = None,
     max_hits: int = 10,
     max_scan: int | None = None,
+    min_prefix: int | None = None,
+    workers: int = 1,
 ) -> list[OeisHit]:
     """
     Offline subsequence search on stripped/stripped.gz.
     Fast substring matching: looks for ',t1,t2,...,tk,' inside each sequence line.
+
+    workers > 1 splits an uncompressed stripped file across that many processes
+    (a .gz stream can't be split, and max_scan needs the serial scan); results are the same.
+
+    With min_prefix, lines containing only the first min_prefix (or more) query terms are
+    hits too: the whole file is scanned and the max_hits longest prefix matches are kept,
+    ranked by match_len, then score.
     """
-    needle = "," + ",".join(str(x) for x in terms) + ","
-    names = {}
-    if names_path is not None and names_path.exists():
-        try:
-            names = load_names_map(names_path)
-        except Exception as ex:
-            eprint(f"[warn] couldn't load names file: {ex}")
+    needle = _comma_wrap(terms)
+    n_filter = _offline_filter_len(terms, min_prefix)
+    partial = n_filter < len(terms)
+    filter_b = _comma_wrap(terms[:n_filter]).encode("ascii")
+    names = _load_names_or_warn(names_path)
+
+    cap = None if partial else max_hits
+    if workers > 1 and stripped_path.suffix != ".gz" and max_scan is None:
+        found = _parallel_mmap_matches(stripped_path, filter_b, workers, cap)
+        scored = _score_stripped_matches(found, needle, len(terms), cap)
+    else:
+        with closing(_iter_stripped_matches(stripped_path, filter_b, max_scan)) as matches:
+            scored = _score_stripped_matches(matches, needle, len(terms), cap)
 
-    hits: list[OeisHit] = []
-    scanned = 0
-    for aid, rest in iter_stripped_lines(stripped_path):
-        scanned += 1
-        if needle in rest:
-            data_terms: list[int] = []
-            for tok in rest.split(","):
-                if not tok:
-                    continue
-                try:
-                    data_terms.append(int(tok))
-                except ValueError:
-                    break
-                if len(data_terms) >= 400:
-                    break
-            mlen, mat = best_subsequence_match(data_terms, list(terms))
-            denom = max(1, min(len(terms), len(data_terms)))
-            score = mlen / denom
-            hits.append(
-                OeisHit(
-                    a_number=aid,
-                    name=names.get(aid, ""),
-                    offset="",
-                    data_terms=data_terms,
-                    match_len=mlen,
-                    match_at=mat,
-                    score=score,
-                )
+    return _offline_top_hits(scored, names, max_hits, by_prefix=partial)
+
+
+def _score_stripped_matches(
+    matches: Iterable[tuple[bytes, bytes]], needle: str, n_terms: int, cap: int | None
+) -> list[tuple[str, str, int, int | None, float]]:
+    """
+    (A-number, data line, match_len, match_at, score) for the first `cap` matches.
+    """
+    scored = []
+    for aid_b, rest_b in matches:
+        rest = rest_b.decode("ascii", errors="replace")
+        scored.append((aid_b.decode("ascii"), rest, *_score_line(rest, needle, n_terms)))
+        if cap is not None and len(scored) >= cap:
+            break
+    return scored
+
+
+def _window_key(window: str) -> int:
+    return zlib.crc32(window.encode("ascii", errors="replace"))
+
+
+def _terms_fingerprint(toks: Iterable[str]) -> int:
+    """
+    63-bit sketch of a set of terms: bit crc32(term) % 63 is set for every term (63 bits so
+    it fits a signed SQLite INTEGER). A sequence can only contain the query if its
+    fingerprint covers the query's.
+    """
+    fp = 0
+    for t in toks:
+        fp |= 1 << (zlib.crc32(t.encode("ascii", errors="replace")) % 63)
+    return fp
+
+
+def build_stripped_index(stripped_path: Path, index_path: Path) -> int:
+    """
+    Build (or rebuild) a SQLite index over stripped/stripped.gz for repeated offline
+    searches. Returns the number of indexed sequences.
+    """
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(index_path, isolation_level=None)
+    try:
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        # one transaction: a failed build leaves the previous index (and a cache table
+        # sharing the DB) untouched
+        con.execute("BEGIN")
+        con.execute("DROP TABLE IF EXISTS seqs")
+        con.execute("DROP TABLE IF EXISTS windows")
+        con.execute(
+            "CREATE TABLE seqs ("
+            "id INTEGER PRIMARY KEY, aid TEXT NOT NULL, fp INTEGER NOT NULL, terms TEXT NOT NULL)"
+        )
+        con.execute(
+            """
+            CREATE TABLE windows (
+                key INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (key, seq)
+            ) WITHOUT ROWID
+            """
+        )
+        n = 0
+        for seq_id, (aid, rest) in enumerate(iter_stripped_lines(stripped_path), start=1):
+            toks = rest.strip(",").split(",")
+            con.execute(
+                "INSERT INTO seqs(id, aid, fp, terms) VALUES(?,?,?,?)",
+                (seq_id, aid, _terms_fingerprint(toks), rest),
+            )
+            keys = {
+                _window_key(",".join(toks[i : i + INDEX_WINDOW]))
+                for i in range(len(toks) - INDEX_WINDOW + 1)
+            }
+            con.executemany(
+                "INSERT INTO windows(key, seq) VALUES(?,?)", ((k, seq_id) for k in keys)
             )
-            if len(hits) >= max_hits:
+            n = seq_id
+        con.execute("COMMIT")
+        return n
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+def _rarest_window_key(con: sqlite3.Connection, terms: Sequence[int]) -> int:
+    """
+    Key of the query window shared by the fewest indexed sequences.
+
+    Any window of the query prefix must occur in a matching sequence, so the rarest one
+    gives the smallest candidate set to verify (a common opening like 1,1,1 can hit a large
+    part of OEIS while a later window is often unique). Counts are capped at the best so
+    far, so probing the common windows stays cheap.
+    """
+    toks = [str(t) for t in terms]
+    keys = dict.fromkeys(
+        _window_key(",".join(toks[i : i + INDEX_WINDOW]))
+        for i in range(len(toks) - INDEX_WINDOW + 1)
+    )
+    best_key, best_n = None, None
+    for key in keys:
+        limit = -1 if best_n is None else best_n
+        (n,) = con.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM windows WHERE key = ? LIMIT ?)", (key, limit)
+        ).fetchone()
+        if best_n is None or n < best_n:
+            best_key, best_n = key, n
+            if n == 0:
                 break
-        if max_scan is not None and scanned >= max_scan:
-            break
+    return best_key
+
+
+def oeis_search_offline_index(
+    terms: Sequence[int],
+    index_path: Path,
+    *,
+    names_path: Path | None = None,
+    max_hits: int = 10,
+    min_prefix: int | None = None,
+) -> list[OeisHit]:
+    """
+    Same results as oeis_search_offline_stripped, using an index from build_stripped_index.
+    Queries shorter than INDEX_WINDOW terms fall back to scanning the indexed sequences.
+    """
+    if not index_path.exists():
+        raise FileNotFoundError(f"offline index not found: {index_path}")
+    needle = _comma_wrap(terms)
+    n_filter = _offline_filter_len(terms, min_prefix)
+    partial = n_filter < len(terms)
+    filter_s = _comma_wrap(terms[:n_filter])
+    names = _load_names_or_warn(names_path)
+
+    con = sqlite3.connect(index_path)
+    try:
+        con.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        has_index = con.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name IN ('seqs', 'windows')"
+        ).fetchone()[0]
+        seq_cols = {row[1] for row in con.execute("PRAGMA table_info(seqs)")}
+        if has_index != 2 or "fp" not in seq_cols:
+            raise FileNotFoundError(
+                f"no offline index in {index_path} (build it with 'oeis-probe build-index')"
+            )
+        # sequences whose term fingerprint misses a query bit are skipped inside SQLite,
+        # before their terms reach Python
+        q_fp = _terms_fingerprint(str(t) for t in terms[:n_filter])
+        if n_filter >= INDEX_WINDOW:
+            key = _rarest_window_key(con, terms[:n_filter])
+            rows = con.execute(
+                "SELECT s.aid, s.terms FROM windows w JOIN seqs s ON s.id = w.seq "
+                "WHERE w.key = ? AND s.fp & ? = ? ORDER BY w.seq",
+                (key, q_fp, q_fp),
+            )
+        else:
+            rows = con.execute(
+                "SELECT aid, terms FROM seqs WHERE fp & ? = ? ORDER BY id", (q_fp, q_fp)
+            )
 
-    return sort_hits(hits, rank="strict")[:max_hits]
+        scored = []
+        for aid, rest in rows:
+            if filter_s in rest:
+                scored.append((aid, rest, *_score_line(rest, needle, len(terms))))
+                if not partial and len(scored) >= max_hits:
+                    break
+    finally:
+        con.close()
+
+    return _offline_top_hits(scored, names, max_hits, by_prefix=partial)
 
 
 def pretty_print_hits(
@@ -460,9 +1387,19 @@ def _early_score(match_at: int | None) -> float:
     return 1.0 / (1.0 + float(match_at))
 
 
-def sort_hits(hits: Sequence[OeisHit], rank: str = "strict") -> list[OeisHit]:
+_strict_key = attrgetter("score", "match_len")
+
+
+def _prefer_early_key(h: OeisHit) -> tuple[float, int, float]:
+    return (h.score, h.match_len, _early_score(h.match_at))
+
+
+def sort_hits(
+    hits: Sequence[OeisHit], rank: str = "strict", *, limit: int | None = None
+) -> list[OeisHit]:
     """
     Sort hits with different tie-break strategies.
+    With limit, return only the best `limit` hits (heap selection, same order as slicing).
 
     strict:
       - prefer higher score
@@ -475,14 +1412,11 @@ def sort_hits(hits: Sequence[OeisHit], rank: str = "strict") -> list[OeisHit]:
     if rank not in ("strict", "prefer-early"):
         raise ValueError("rank must be 'strict' or 'prefer-early'")
 
-    if rank == "strict":
-        return sorted(hits, key=lambda h: (h.score, h.match_len), reverse=True)
+    key = _strict_key if rank == "strict" else _prefer_early_key
 
-    return sorted(
-        hits,
-        key=lambda h: (h.score, h.match_len, _early_score(h.match_at)),
-        reverse=True,
-    )
+    if limit is not None:
+        return heapq.nlargest(max(0, limit), hits, key=key)
+    return sorted(hits, key=key, reverse=True)
 
 
 def mismatch_details(query_terms: Sequence[int], hit: OeisHit) -> dict:
@@ -0,0 +1,45 @@
+import json
+
+from oeis_probe import cli
+from oeis_probe.core import build_stripped_index
+
+
+def test_relax_online_finds_longest_known_prefix_in_few_calls(monkeypatch):
+    terms = list(range(40))
+    calls = []
+
+    def fake_search(terms, *, max_query_terms, **kwargs):
+        calls.append(max_query_terms)
+        if max_query_terms > 13:
+            return None
+        return [{"number": 1, "data": ",".join(map(str, terms[:max_query_terms]))}]
+
+    monkeypatch.setattr(cli, "oeis_search_online", fake_search)
+    hits, err = cli._online_probe_with_optional_relax(
+        terms,
+        oeis_base="",
+        timeout=1.0,
+        cache=None,
+        cache_ttl_days=1,
+        max_query_terms=40,
+        max_hits=5,
+        relax_online=True,
+        relax_min_terms=8,
+    )
+    assert err is None
+    assert hits[0].match_len == 13
+    assert max(q for q in calls if q <= 13) == 13
+    assert len(calls) < 40 - 13
+
+
+def test_offline_index_cache_flag_does_not_swallow_terms(tmp_path):
+    db = tmp_path / "cache.sqlite"
+    stripped = tmp_path / "stripped"
+    stripped.write_text("A000027 ,1,2,3,4,\n", encoding="utf-8")
+    build_stripped_index(stripped, db)
+    out = tmp_path / "hits.json"
+    argv = ["--offline-index-cache", "1,2,3", "--no-online", "--cache-db", str(db)]
+    assert cli.main([*argv, "--json-out", str(out)]) == 0
+    result = json.loads(out.read_text(encoding="utf-8"))
+    assert result["query_terms"] == [1, 2, 3]
+    assert result["hits"][0]["a_number"] == "A000027"
@@ -1,10 +1,38 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+from dataclasses import fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from oeis_probe import core
 from oeis_probe.core import (
+    OeisCache,
     OeisHit,
+    _rarest_window_key,
+    _terms_fingerprint,
+    _window_key,
     best_subsequence_match,
+    build_stripped_index,
     hits_from_online_json,
+    json_loads_search_results,
+    load_names_map,
+    materialize_stripped,
     mismatch_details,
+    oeis_search_offline_index,
+    oeis_search_offline_stripped,
+    parse_oeis_data_terms,
     parse_terms,
     sort_hits,
+    terms_to_query_string,
 )
 
 
@@ -45,3 +73,617 @@ def test_mismatch_details_reports_first_mismatch():
     assert d["query_index"] == 11
     assert d["got"] == 99
     assert d["expected"] == 22
+
+
+def test_oeis_cache_roundtrip_and_ttl(tmp_path):
+    cache = OeisCache(tmp_path / "c.sqlite")
+    cache.put("k", '{"x": 1}')
+    assert cache.get("k", ttl_days=30) == '{"x": 1}'
+    payload, created_at = cache.get_entry("k", ttl_days=30)
+    assert payload == '{"x": 1}' and created_at > 0
+    assert cache.get("missing", ttl_days=30) is None
+    assert cache.get("k", ttl_days=-1) is None
+    cache.close()
+
+
+def test_oeis_cache_recreates_old_text_schema(tmp_path):
+    db = tmp_path / "c.sqlite"
+    con = sqlite3.connect(db)
+    con.execute("CREATE TABLE cache (key TEXT PRIMARY KEY, created_at INTEGER, payload TEXT)")
+    con.execute("INSERT INTO cache VALUES('k', 0, '[]')")
+    con.commit()
+    con.close()
+
+    with OeisCache(db) as cache:
+        assert cache.get("k", ttl_days=100000) is None
+        cache.put("k", '{"x": 1}')
+        assert cache.get("k", ttl_days=1) == '{"x": 1}'
+        raw = cache._con.execute("SELECT payload FROM cache").fetchone()[0]
+        assert isinstance(raw, bytes)
+    with OeisCache(db) as cache:
+        assert cache.get("k", ttl_days=1) == '{"x": 1}'
+
+
+def test_oeis_search_online_caches_raw_text(tmp_path, monkeypatch):
+    calls = []
+    raw = '[{"number": 45, "data": "0,1,1,2"}]'
+
+    def fake_get_text(url, timeout=10.0, user_agent=""):
+        calls.append(url)
+        return raw
+
+    monkeypatch.setattr(core, "http_get_text", fake_get_text)
+    cache = OeisCache(tmp_path / "c.sqlite")
+    p1 = core.oeis_search_online([0, 1, 1, 2], cache=cache)
+    p2 = core.oeis_search_online([0, 1, 1, 2], cache=cache)
+    assert p1 == p2 == [{"number": 45, "data": "0,1,1,2"}]
+    assert len(calls) == 1
+    cache.close()
+
+
+def _naive_best_match(hay, needle):
+    best_len, best_at = 0, None
+    for start in range(len(hay)):
+        k = 0
+        while start + k < len(hay) and k < len(needle) and hay[start + k] == needle[k]:
+            k += 1
+        if k > best_len:
+            best_len, best_at = k, start
+    return best_len, best_at
+
+
+def test_best_subsequence_match_agrees_with_naive_scan():
+    rng = random.Random(1234)
+    for _ in range(500):
+        hay = [rng.randint(-3, 12) for _ in range(rng.randint(0, 30))]
+        needle = [rng.randint(-3, 12) for _ in range(rng.randint(0, 8))]
+        if hay and rng.random() < 0.5:
+            i = rng.randrange(len(hay))
+            needle = hay[i : i + rng.randint(1, 8)] + needle[:2]
+        assert best_subsequence_match(hay, needle) == _naive_best_match(hay, needle)
+
+
+def test_offline_stripped_search_parses_only_needed_prefix(tmp_path):
+    long_tail = ",".join(str(i) for i in range(1000))
+    stripped = tmp_path / "stripped"
+    stripped.write_text(
+        "# header\nA000001 ,1,1,2,3,5,\nA000027 ," + long_tail + ",\n", encoding="utf-8"
+    )
+    hits = oeis_search_offline_stripped([40, 41, 42], stripped)
+    assert [h.a_number for h in hits] == ["A000027"]
+    h = hits[0]
+    assert (h.match_len, h.match_at, h.score) == (3, 40, 1.0)
+    assert h.data_terms[:3] == [0, 1, 2]
+    assert len(h.data_terms) == 44
+
+
+def test_offline_index_matches_full_scan(tmp_path):
+    stripped = tmp_path / "stripped"
+    stripped.write_text(
+        "A000001 ,1,2,3,4,5,6,\nA000002 ,0,1,2,3,4,\nA000003 ,-1,2,3,9,\nA000004 ,7,1,2,\n",
+        encoding="utf-8",
+    )
+    index = tmp_path / "idx.sqlite"
+    assert build_stripped_index(stripped, index) == 4
+    for q in ([1, 2, 3], [2, 3, 4, 5], [2, 3], [1, 2], [-1, 2, 3], [9, 9, 9]):
+        full = oeis_search_offline_stripped(q, stripped)
+        idx = oeis_search_offline_index(q, index)
+        assert [(h.a_number, h.match_at) for h in idx] == [(h.a_number, h.match_at) for h in full]
+
+
+def test_offline_index_probes_the_rarest_window(tmp_path):
+    lines = [f"A{i:06d} ,1,1,1,{i},\n" for i in range(1, 40)]
+    lines.append("A000099 ,0,1,1,1,7,8,\n")
+    stripped = tmp_path / "stripped"
+    stripped.write_text("".join(lines), encoding="utf-8")
+    index = tmp_path / "idx.sqlite"
+    build_stripped_index(stripped, index)
+
+    with sqlite3.connect(index) as con:
+        assert _rarest_window_key(con, [1, 1, 1, 7, 8]) == _window_key("1,7,8")
+    for q in ([1, 1, 1, 7, 8], [1, 1, 1, 5], [1, 1, 1]):
+        full = oeis_search_offline_stripped(q, stripped, max_hits=50)
+        idx = oeis_search_offline_index(q, index, max_hits=50)
+        assert [(h.a_number, h.match_at) for h in idx] == [(h.a_number, h.match_at) for h in full]
+
+
+def test_iter_stripped_lines_across_chunks_and_gz(tmp_path, monkeypatch):
+    lines = ["# comment", ""] + [f"A{i:06d} ,{i},{i + 1},{i + 2}," for i in range(1, 200)]
+    text = "\n".join(lines)  # no trailing newline: last line sits in the tail buffer
+    plain = tmp_path / "stripped"
+    plain.write_text(text, encoding="utf-8")
+    gz = tmp_path / "stripped.gz"
+    with gzip.open(gz, "wt", encoding="utf-8") as f:
+        f.write(text)
+
+    monkeypatch.setattr(core, "READ_CHUNK_SIZE", 7)
+    expected = [(f"A{i:06d}", f",{i},{i + 1},{i + 2},") for i in range(1, 200)]
+    assert list(core.iter_stripped_lines(plain)) == expected
+    assert list(core.iter_stripped_lines(gz)) == expected
+
+
+def test_http_get_text_reuses_connection_and_retries(monkeypatch):
+    seen_ports = []
+    statuses = [429, 503, 200, 200]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            seen_ports.append(self.client_address[1])
+            body = b'{"ok": true}'
+            self.send_response(statuses.pop(0))
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(core, "HTTP_BACKOFF", 0.0)
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/search?q=1,2,3&fmt=json"
+        assert core.http_get_json(url) == {"ok": True}
+        assert core.http_get_json(url) == {"ok": True}
+        assert len(seen_ports) == 4
+        assert len(set(seen_ports)) == 1
+    finally:
+        core.close_http_pool()
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_get_text_honors_proxy_environment(monkeypatch):
+    seen = []
+
+    class Proxy(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            seen.append(("GET", self.path, self.headers.get("Proxy-Authorization")))
+            body = b'"ok"'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_CONNECT(self):
+            seen.append(("CONNECT", self.path, self.headers.get("Proxy-Authorization")))
+            self.send_response(407)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Proxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = f"http://u%40x:pw@127.0.0.1:{server.server_address[1]}"
+    for var in ("no_proxy", "NO_PROXY", "HTTP_PROXY", "HTTPS_PROXY"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("http_proxy", proxy)
+    monkeypatch.setenv("https_proxy", proxy)
+    monkeypatch.setattr(core, "HTTP_RETRIES", 0)
+    try:
+        assert core.http_get_json("http://oeis.example/search?q=1,2") == "ok"
+        with pytest.raises(urllib.error.URLError, match="407"):
+            core.http_get_text("https://oeis.example/search?q=1,2")
+        auth = "Basic dUB4OnB3"  # base64("u@x:pw")
+        assert seen == [
+            ("GET", "http://oeis.example/search?q=1,2", auth),
+            ("CONNECT", "oeis.example:443", auth),
+        ]
+
+        monkeypatch.setenv("no_proxy", "127.0.0.1")
+        direct = f"http://127.0.0.1:{server.server_address[1]}/direct"
+        assert core.http_get_json(direct) == "ok"
+        assert seen[-1] == ("GET", "/direct", None)
+    finally:
+        core.close_http_pool()
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_get_text_retries_and_wraps_connect_errors(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]  # closed again: connections are refused
+
+    delays = []
+    monkeypatch.setattr(core.time, "sleep", delays.append)
+    monkeypatch.setenv("no_proxy", "127.0.0.1")
+    with pytest.raises(urllib.error.URLError) as exc:
+        core.http_get_text(f"http://127.0.0.1:{port}/")
+    assert isinstance(exc.value.reason, ConnectionRefusedError)
+    assert len(delays) == core.HTTP_RETRIES
+
+
+def test_sort_hits_limit_matches_sorted_slice():
+    hits = [
+        OeisHit(f"A{i:06d}", "", "", [], ml, at, sc)
+        for i, (sc, ml, at) in enumerate(
+            [(1.0, 5, 3), (0.5, 2, 0), (1.0, 5, 0), (1.0, 7, 9), (0.5, 2, 1), (1.0, 5, 3)]
+        )
+    ]
+    for rank in ("strict", "prefer-early"):
+        for k in range(0, 8):
+            assert sort_hits(hits, rank=rank, limit=k) == sort_hits(hits, rank=rank)[:k]
+
+
+def test_hits_from_online_json_partial_match_deep_in_data():
+    data = list(range(100))
+    payload = {"results": [{"number": 27, "data": ", ".join(map(str, data)), "name": "n"}]}
+    q = [50, 51, 52, 53, 99]
+    hits = hits_from_online_json(q, payload)
+    h = hits[0]
+    assert (h.match_len, h.match_at) == (4, 50)
+    assert h.score == 4 / 5
+    d = mismatch_details(q, h)
+    assert (d["status"], d["got"], d["expected"]) == ("mismatch", 99, 54)
+
+
+def test_offline_names_are_loaded_once(tmp_path, monkeypatch):
+    stripped = tmp_path / "stripped"
+    stripped.write_text("A000027 ,1,2,3,4,\n", encoding="utf-8")
+    names = tmp_path / "names"
+    names.write_text("A000027 The positive integers.\n", encoding="utf-8")
+
+    calls = []
+    real = core.load_names_map
+    monkeypatch.setattr(core, "load_names_map", lambda p: calls.append(p) or real(p))
+    core._load_names_cached.cache_clear()
+    for _ in range(3):
+        hits = core.oeis_search_offline_stripped([2, 3], stripped, names_path=names)
+        assert hits[0].name == "The positive integers."
+    assert len(calls) == 1
+
+
+def test_parse_oeis_data_terms_fast_and_fallback_paths():
+    assert parse_oeis_data_terms(" 1, 2,3\n") == [1, 2, 3]
+    assert parse_oeis_data_terms(",1,2,3,") == [1, 2, 3]
+    assert parse_oeis_data_terms("1,2,3,4", max_terms=2) == [1, 2]
+    assert parse_oeis_data_terms("1,,2,x,3") == [1, 2]
+    assert parse_oeis_data_terms(",") == []
+    big = str(10**40)
+    assert parse_oeis_data_terms(f"1,{big}") == [1, 10**40]
+
+
+def test_parse_terms_rejects_non_integers():
+    assert parse_terms("1,\n2\t-3") == [1, 2, -3]
+    with pytest.raises(ValueError, match="bad term '1.5'"):
+        parse_terms("0, 1.5, 2")
+    with pytest.raises(ValueError, match="empty"):
+        parse_terms("  ")
+
+
+@pytest.mark.parametrize("gz", [False, True])
+def test_offline_stripped_block_scan_edge_cases(tmp_path, monkeypatch, gz):
+    def write(name, text):
+        path = tmp_path / (name + (".gz" if gz else ""))
+        if gz:
+            with gzip.open(path, "wt", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            path.write_text(text, encoding="utf-8")
+        return path
+
+    stripped = write(
+        "stripped",
+        "# A999999 ,1,2,3,\n"
+        "A000001 ,1,2,3,1,2,3,\n"
+        "A000002 ,5,-1,2,3,\n"
+        "A000003 ,0,1,2,3,",  # no trailing newline
+    )
+    monkeypatch.setattr(core, "READ_CHUNK_SIZE", 5)
+    monkeypatch.setattr(core, "MMAP_WINDOW_SIZE", 5)
+    hits = core.oeis_search_offline_stripped([1, 2, 3], stripped)
+    assert sorted((h.a_number, h.match_at) for h in hits) == [("A000001", 0), ("A000003", 1)]
+    assert [
+        h.a_number for h in core.oeis_search_offline_stripped([1, 2], stripped, max_scan=2)
+    ] == ["A000001"]
+
+    spaced = write(
+        "spaced",
+        "A000001 ,1, 2, 3,\n"
+        "A000002 ,1 ,2 ,3 ,\n"
+        "  A000003 , 1 , 2 ,3,\n"
+        "A000004 ,1,2,3,\n"
+        "A00005 ,1,2,3,\n"  # malformed A-numbers are skipped
+        "A0000066 ,1,2,3,\n",
+    )
+    expected = ["A000001", "A000002", "A000003", "A000004"]
+    hits = core.oeis_search_offline_stripped([1, 2, 3], spaced)
+    assert sorted(h.a_number for h in hits) == expected
+    index = tmp_path / "idx.sqlite"
+    core.build_stripped_index(spaced, index)
+    assert sorted(h.a_number for h in core.oeis_search_offline_index([1, 2, 3], index)) == expected
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_json_dumps_handles_big_integers(tmp_path, monkeypatch, use_orjson):
+    if use_orjson:
+        pytest.importorskip("orjson")  # part of the dev extra
+        assert core.orjson is not None
+    else:
+        monkeypatch.setattr(core, "orjson", None)
+
+    obj = {"data_prefix": [1, 10**30], "name": "Fibonacci — φ"}
+    assert json.loads(core.json_dumps(obj)) == obj
+    assert json.loads(core.json_dumps(obj, indent=True)) == obj
+    assert core.json_loads('[{"number": 45}]') == [{"number": 45}]
+    assert core.json_loads(b'{"data": "0,1,1"}') == {"data": "0,1,1"}
+
+    small = {"a_number": "A000045", "name": "Fibonacci — φ"}
+    for i, o in enumerate((obj, small)):
+        out = tmp_path / f"out{i}.json"
+        core.write_json(out, o)
+        assert json.loads(out.read_text(encoding="utf-8")) == o
+
+
+def test_empty_online_results_are_cached_with_short_ttl(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        core, "http_get_text", lambda url, timeout=10.0: calls.append(url) or "null"
+    )
+    cache = OeisCache(tmp_path / "c.sqlite")
+    assert core.oeis_search_online([9, 9, 9, 1], cache=cache) is None
+    assert core.oeis_search_online([9, 9, 9, 1], cache=cache) is None
+    assert len(calls) == 1
+
+    now = core.now_epoch()
+    monkeypatch.setattr(core, "now_epoch", lambda: now + 2 * 86400)
+    core.oeis_search_online([9, 9, 9, 1], cache=cache)
+    assert len(calls) == 2
+    cache.close()
+
+
+def test_best_subsequence_match_accepts_comma_wrapped_strings():
+    assert best_subsequence_match(",5,1,2,3,9,", [1, 2, 3]) == (3, 1)
+    assert best_subsequence_match([5, 1, 2, 3, 9], ",1,2,4,") == (2, 1)
+
+
+def test_offline_min_prefix_ranks_partial_matches(tmp_path):
+    stripped = tmp_path / "stripped"
+    stripped.write_text(
+        "A000001 ,9,1,2,3,4,7,\nA000002 ,1,2,3,4,5,6,\nA000003 ,0,1,2,8,\nA000004 ,1,2,\n",
+        encoding="utf-8",
+    )
+    q = [1, 2, 3, 4, 5, 99]
+    assert oeis_search_offline_stripped(q, stripped) == []
+    hits = oeis_search_offline_stripped(q, stripped, min_prefix=3, max_hits=5)
+    assert [(h.a_number, h.match_len) for h in hits] == [("A000002", 5), ("A000001", 4)]
+
+    index = tmp_path / "idx.sqlite"
+    build_stripped_index(stripped, index)
+    assert oeis_search_offline_index(q, index, min_prefix=3, max_hits=5) == hits
+    assert len(oeis_search_offline_index(q, index, min_prefix=2, max_hits=5)) == 4
+
+
+def test_offline_min_prefix_keeps_long_prefixes_over_short_sequences(tmp_path):
+    stripped = tmp_path / "stripped"
+    long_seq = ",".join(map(str, range(1, 21)))
+    stripped.write_text(f"A000001 ,1,2,3,\nA000002 ,{long_seq},\n", encoding="utf-8")
+    q = [*range(1, 12), 99]
+    hits = oeis_search_offline_stripped(q, stripped, min_prefix=3, max_hits=1)
+    assert [(h.a_number, h.match_len) for h in hits] == [("A000002", 11)]
+    both = oeis_search_offline_stripped(q, stripped, min_prefix=3, max_hits=2)
+    assert [(h.a_number, h.match_len, h.score) for h in both] == [
+        ("A000002", 11, 11 / 12),
+        ("A000001", 3, 1.0),
+    ]
+
+    index = tmp_path / "idx.sqlite"
+    build_stripped_index(stripped, index)
+    assert oeis_search_offline_index(q, index, min_prefix=3, max_hits=1) == hits
+
+
+def test_load_names_map_plain_and_gz(tmp_path):
+    text = "# header\nA000045 Fibonacci numbers: F(n) = F(n-1) + F(n-2).\nA000108 Catalan — C(n)\nbad\n"
+    plain = tmp_path / "names"
+    plain.write_text(text, encoding="utf-8")
+    gz = tmp_path / "names.gz"
+    with gzip.open(gz, "wt", encoding="utf-8") as f:
+        f.write(text)
+    expected = {
+        "A000045": "Fibonacci numbers: F(n) = F(n-1) + F(n-2).",
+        "A000108": "Catalan — C(n)",
+    }
+    assert load_names_map(plain) == expected
+    assert load_names_map(gz) == expected
+    assert load_names_map(gz, limit=1) == {"A000045": expected["A000045"]}
+
+
+def test_offline_stripped_parallel_scan_matches_serial(tmp_path):
+    stripped = tmp_path / "stripped"
+    stripped.write_text(
+        "".join(f"A{i:06d} ,{i % 7},{i % 5},{i % 3},1,2,\n" for i in range(1, 400)),
+        encoding="utf-8",
+    )
+    for q, kw in (([1, 2], {}), ([3, 1, 2], {"max_hits": 50}), ([0, 0, 9, 1], {"min_prefix": 2})):
+        serial = oeis_search_offline_stripped(q, stripped, **kw)
+        assert serial
+        assert oeis_search_offline_stripped(q, stripped, workers=3, **kw) == serial
+
+
+def test_offline_index_can_live_in_the_cache_db(tmp_path):
+    db = tmp_path / "cache.sqlite"
+    cache = OeisCache(db)
+    cache.put("k", "[]")
+    with pytest.raises(FileNotFoundError, match="build-index"):
+        oeis_search_offline_index([1, 2, 3], db)
+
+    stripped = tmp_path / "stripped"
+    stripped.write_text("A000027 ,1,2,3,4,\n", encoding="utf-8")
+    build_stripped_index(stripped, db)
+    assert oeis_search_offline_index([1, 2, 3], db)[0].a_number == "A000027"
+    assert cache.get("k", ttl_days=1) == "[]"
+    cache.close()
+
+
+def test_json_loads_search_results_keeps_ranking_fields():
+    text = (
+        '[{"number": 45, "data": "0,1,1,2,3,5", "name": "Fibonacci", "offset": "0,4",'
+        ' "comment": ["long"], "formula": ["F(n) = F(n-1) + F(n-2)"]}]'
+    )
+    payload = json_loads_search_results(text)
+    assert payload[0]["number"] == 45
+    assert payload[0]["data"] == "0,1,1,2,3,5"
+    assert json_loads_search_results("null") is None
+    wrapped = json_loads_search_results('{"results": [{"number": 1, "data": "1"}]}')
+    assert hits_from_online_json([1], wrapped)[0].a_number == "A000001"
+    odd = json_loads_search_results('[{"number": null, "id": "A000002", "data": "1,2"}]')
+    assert hits_from_online_json([1, 2], odd)[0].a_number == "A000002"
+
+
+@pytest.mark.parametrize("use_msgspec", [True, False])
+def test_json_loads_search_results_non_result_objects(monkeypatch, use_msgspec):
+    if use_msgspec:
+        pytest.importorskip("msgspec")  # part of the dev extra
+        assert core.msgspec is not None
+    else:
+        monkeypatch.setattr(core, "msgspec", None)
+
+    for text in (
+        '{"greeting": "Greetings", "count": 0, "results": null}',
+        '{"error": "Too many requests"}',
+        "{}",
+    ):
+        payload = core.json_loads_search_results(text)
+        assert payload == core.json_loads(text)
+        assert hits_from_online_json([1, 2, 3], payload) == []
+    bare = '{"number": 45, "data": "0,1,1,2", "comment": ["x"]}'
+    assert hits_from_online_json([1, 1, 2], core.json_loads_search_results(bare))[0].match_len == 3
+
+
+def test_hits_from_online_json_selects_like_sort_hits():
+    rng = random.Random(7)
+    terms = [1, 2, 3, 4]
+    payload = [
+        {"number": i, "data": ",".join(str(rng.randint(0, 5)) for _ in range(rng.randint(0, 12)))}
+        for i in range(1, 41)
+    ]
+    everything = hits_from_online_json(terms, payload, max_hits=1000)
+    for k in (0, 1, 3, 10):
+        top = hits_from_online_json(terms, payload, max_hits=k)
+        pool = sorted(
+            (h for h in everything if int(h.a_number[1:]) <= k * 3),
+            key=lambda h: int(h.a_number[1:]),
+        )
+        assert top == sort_hits(pool, limit=k)
+
+
+def test_materialize_stripped_reuses_plain_copy(tmp_path):
+    def write_gz(path, text):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    src = write_gz(
+        tmp_path / "a" / "stripped.gz", "# header\nA000027 ,1 ,2,3,4,\nA000045 ,0,1,1,2,3,5,\n"
+    )
+    cache_dir = tmp_path / "cache"
+    plain = materialize_stripped(src, cache_dir)
+    assert plain.parent == cache_dir and plain.suffix != ".gz"
+    assert b" " not in plain.read_bytes()
+    assert oeis_search_offline_stripped([1, 2, 3], plain) == oeis_search_offline_stripped(
+        [1, 2, 3], src
+    )
+    assert sorted(p.name for p in cache_dir.iterdir() if p.suffix == ".tmp") == []
+
+    plain.write_bytes(b"stale")  # rewritten only when the source changes
+    assert materialize_stripped(src, cache_dir).read_bytes() == b"stale"
+    os.utime(src, ns=(0, os.stat(src).st_mtime_ns + 10**9))
+    assert b"A000045" in materialize_stripped(src, cache_dir).read_bytes()
+    assert materialize_stripped(plain, cache_dir) == plain
+
+    # same name and mtime, different file: gets its own copy
+    other = write_gz(tmp_path / "b" / "stripped.gz", "A000290 ,0,1,4,9,\n")
+    shutil.copystat(src, other)
+    other_plain = materialize_stripped(other, cache_dir)
+    assert other_plain != plain
+    assert b"A000290" in other_plain.read_bytes()
+    assert b"A000045" in materialize_stripped(src, cache_dir).read_bytes()
+
+
+def test_offline_index_fingerprint_filter(tmp_path):
+    fp = _terms_fingerprint(["1", "2", "30"])
+    assert fp & _terms_fingerprint(["30", "1"]) == _terms_fingerprint(["30", "1"])
+    assert 0 < fp < 1 << 63
+
+    stripped = tmp_path / "stripped"
+    stripped.write_text("A000001 ,5,7,\nA000002 ,7,5,\nA000003 ,1,2,\n", encoding="utf-8")
+    index = tmp_path / "idx.sqlite"
+    build_stripped_index(stripped, index)
+    assert [h.a_number for h in oeis_search_offline_index([7, 5], index)] == ["A000002"]
+    assert oeis_search_offline_index([9], index) == []
+
+    with sqlite3.connect(index) as con:  # an index built before fingerprints existed
+        con.execute("ALTER TABLE seqs DROP COLUMN fp")
+    with pytest.raises(FileNotFoundError, match="build-index"):
+        oeis_search_offline_index([7, 5], index)
+
+
+def test_oeis_hit_is_slotted():
+    h = OeisHit("A000001", "", "", [1], 1, 0, 1.0)
+    assert not hasattr(h, "__dict__")
+    assert [f.name for f in fields(h)][-1] == "score"
+
+
+def test_oeis_fetch_by_ids_online_parallel_in_order(tmp_path, monkeypatch):
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def fake_get_text(url, timeout=10.0, user_agent=""):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        a = url.split("id%3A")[1].split("&")[0]
+        return f'[{{"number": {int(a[1:])}, "data": "1"}}]'
+
+    monkeypatch.setattr(core, "http_get_text", fake_get_text)
+    ids = ["A000045", "a000040", "A000027", "A000001"]
+    with OeisCache(tmp_path / "c.sqlite") as cache:
+        payloads = core.oeis_fetch_by_ids_online(ids, cache=cache)
+        assert [p[0]["number"] for p in payloads] == [45, 40, 27, 1]
+        assert peak[0] > 1
+        assert cache.get(core._request_key(core._fetch_url("A000040", core.DEFAULT_OEIS_BASE)), 1)
+    with pytest.raises(ValueError):
+        core.oeis_fetch_by_ids_online(["A000045", "45"])
+
+
+def test_terms_to_query_string_small_and_big_terms():
+    assert terms_to_query_string([0, -5, 999, -999]) == "0,-5,999,-999"
+    assert terms_to_query_string([1, 1000, -1000, 10**30]) == f"1,1000,-1000,{10**30}"
+    assert terms_to_query_string([3, 2, 1], max_terms=2) == "3,2"
+    assert terms_to_query_string([]) == ""
+
+
+def test_build_stripped_index_failure_keeps_previous_index(tmp_path, monkeypatch):
+    stripped = tmp_path / "stripped"
+    stripped.write_text("A000027 ,1,2,3,4,\n", encoding="utf-8")
+    db = tmp_path / "cache.sqlite"
+    with OeisCache(db) as cache:
+        cache.put("k", "[]")
+    core.build_stripped_index(stripped, db)
+
+    def broken_lines(path):
+        yield "A000045", ",0,1,1,2,3,"
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(core, "iter_stripped_lines", broken_lines)
+    with pytest.raises(KeyboardInterrupt):
+        core.build_stripped_index(stripped, db)
+    assert core.oeis_search_offline_index([1, 2, 3], db)[0].a_number == "A000027"
+    assert core.oeis_search_offline_index([0, 1, 1, 2], db) == []
+    with OeisCache(db) as cache:
+        assert cache.get("k", ttl_days=1) == "[]"